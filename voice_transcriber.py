@@ -1,90 +1,626 @@
 """
 Voice Transcriber - Транскрипция голоса с микрофона в буфер обмена Windows
-Требуемые библиотеки: pip install SpeechRecognition pyaudio pyperclip openai-whisper
+Требуемые библиотеки: pip install pyaudio pyperclip faster-whisper numpy scipy
+(при отсутствии faster-whisper используется openai-whisper;
+webrtcvad необязателен и уточняет границы фраз)
 """
 
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
-import speech_recognition as sr
+import queue
+import collections
+import concurrent.futures
+import multiprocessing
 import pyperclip
-import io
-import wave
-import tempfile
+import sys
+import platform
+import ctypes
 import os
-import struct
-import whisper
 import logging
-import subprocess
+import gc
+import functools
+import shutil
+import math
+import time
+import numpy as np
+
+try:
+    import soxr  # Быстрый SIMD-ресемплер; без него используется scipy
+except ImportError:
+    soxr = None
+    # scipy.signal тянет за собой много модулей, поэтому импортируется только как запасной вариант
+    from scipy.signal import resample_poly
+
+try:
+    import psutil  # Число физических ядер; без него ориентируемся на логические
+except ImportError:
+    psutil = None
+
+try:
+    import webrtcvad  # Покадровый VAD; без него фразы режутся только по энергии
+except ImportError:
+    webrtcvad = None
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', encoding='utf-8')
 logger = logging.getLogger(__name__)
 
+# Потоки для инференса: оставляем ядра главному циклу Tk и потоку захвата звука,
+# и не больше числа физических ядер — второй поток гипертрединга в GEMM только мешает.
+# Переменные окружения должны быть заданы до импорта библиотек с OpenMP/MKL
+INFERENCE_THREADS = max(1, (os.cpu_count() or 1) - 2)
+_PHYSICAL_CORES = psutil.cpu_count(logical=False) if psutil is not None else None
+if _PHYSICAL_CORES:
+    INFERENCE_THREADS = min(INFERENCE_THREADS, _PHYSICAL_CORES)
+os.environ.setdefault("OMP_NUM_THREADS", str(INFERENCE_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(INFERENCE_THREADS))
+
+# Бэкенд распознавания: faster-whisper (CTranslate2, int8) или openai-whisper в качестве запасного варианта
+try:
+    import ctranslate2
+    from faster_whisper import WhisperModel
+    WHISPER_BACKEND = "faster-whisper"
+except ImportError:
+    import torch
+    import whisper
+    WHISPER_BACKEND = "whisper"
+    torch.set_num_threads(INFERENCE_THREADS)
+    torch.set_num_interop_threads(1)
+    torch.backends.mkldnn.enabled = True  # Ядра oneDNN для свёрток энкодера и матричных умножений
+    torch.set_grad_enabled(False)  # Градиенты не нужны; действует только на главный поток
+logger.info(f"Бэкенд распознавания: {WHISPER_BACKEND}, потоков инференса: {INFERENCE_THREADS}")
+
+try:
+    # Необязательный бэкенд ONNX Runtime: слитые ядра внимания и int8-веса на CPU.
+    # Импортируется после настройки потоков: optimum и transformers подтягивают torch
+    import onnxruntime
+    import torch
+    from optimum.onnxruntime import ORTModelForSpeechSeq2Seq, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import WhisperProcessor
+except ImportError:
+    ORTModelForSpeechSeq2Seq = None
+
+# Типы вычислений модели (в терминах CTranslate2); "auto" выбирается по устройству
+COMPUTE_TYPES = ["auto", "int8", "int8_float16", "float16"]
+DEFAULT_COMPUTE_TYPE = "auto"
+
+# Устройства вычислений: "auto" выбирает GPU, если он доступен (CTranslate2 не поддерживает MPS)
+if WHISPER_BACKEND == "faster-whisper":
+    COMPUTE_DEVICES = ["auto", "cpu", "cuda"]
+else:
+    COMPUTE_DEVICES = ["auto", "cpu", "cuda", "mps"]
+if ORTModelForSpeechSeq2Seq is not None:
+    COMPUTE_DEVICES.append("onnx")  # ONNX Runtime на CPU, выбирается только явно
+DEFAULT_COMPUTE_DEVICE = "auto"
+
+# Экспортированные и квантованные ONNX-модели сохраняются, чтобы конвертация шла один раз
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "voice_transcriber", "onnx")
+
+# Жадное декодирование: faster-whisper по умолчанию ищет лучом из 5 гипотез,
+# что для коротких фраз почти не улучшает текст, но кратно замедляет декодер.
+# Лучевой поиск остаётся доступен переключателем «Точное распознавание»
+BEAM_SIZE_FAST = 1
+BEAM_SIZE_ACCURATE = 5
+
+# Параметры декодирования, общие для обоих бэкендов: без повторов с повышением температуры,
+# без подстановки предыдущего текста (фразы короткие, контекст передаётся через initial_prompt)
+# и без токенов временных меток, которые приложению не нужны, но удлиняют декодирование
+DECODE_OPTIONS = {
+    "temperature": 0.0,
+    "condition_on_previous_text": False,
+    "without_timestamps": True,
+    "no_speech_threshold": 0.6,
+    "compression_ratio_threshold": 2.4,
+}
+
+# Языки интерфейса (коды в формате Google) и соответствующие коды Whisper
+GOOGLE_TO_WHISPER_LANGUAGE = {
+    "ru-RU": "ru",
+    "en-US": "en",
+    "de-DE": "de",
+    "fr-FR": "fr",
+    "es-ES": "es"
+}
+
+# Сколько загруженных моделей держать в памяти для быстрого переключения
+MODEL_CACHE_SIZE = 2
+
+# Whisper ожидает моно-аудио с частотой 16 кГц
+WHISPER_SAMPLE_RATE = 16000
+PCM16_SCALE = 1.0 / 32768.0  # Нормировка 16-битных сэмплов в диапазон [-1, 1)
+
+# Параметры захвата: один постоянный поток PyAudio на всю сессию записи
+# (значения по умолчанию совпадают с прежними настройками speech_recognition)
+CHUNK_SIZE = 512             # Кадров в одном буфере (32 мс при 16 кГц): чаще решения VAD, меньше задержка
+CALIBRATION_DURATION = 0.3   # Длительность калибровки по фоновому шуму, с (дальше порог подстраивается на паузах)
+PAUSE_THRESHOLD = 0.8        # Пауза, завершающая фразу, с
+PHRASE_THRESHOLD = 0.3       # Минимальная длительность речи во фразе, с
+NON_SPEAKING_DURATION = 0.5  # Тишина, сохраняемая перед началом фразы, с
+TRAILING_SILENCE = 0.2       # Тишина, оставляемая после конца фразы (остальная пауза отрезается), с
+PHRASE_TIME_LIMIT = 15       # Максимальная длительность фразы, с
+UTTERANCE_QUEUE_SIZE = 3     # Фраз, ожидающих распознавания, пока запись продолжается
+# Сэмплов в переиспользуемом буфере float32 потока распознавания (самая длинная фраза при 16 кГц)
+SAMPLES_BUFFER_SIZE = WHISPER_SAMPLE_RATE * (PHRASE_TIME_LIMIT + 1)
+DYNAMIC_ENERGY_DAMPING = 0.15
+DYNAMIC_ENERGY_RATIO = 1.5
+
+# webrtcvad: самый строгий режим, кадры по 10 мс (буфер в CHUNK_SIZE кадров вмещает
+# хотя бы один такой кадр даже при 48 кГц), поддерживаемые частоты потока
+WEBRTC_VAD_MODE = 3
+WEBRTC_FRAME_MS = 10
+WEBRTC_SAMPLE_RATES = (8000, 16000, 32000, 48000)
+
+# Потоковый режим: окно не длиннее 5 с, промежуточное распознавание каждую секунду
+STREAM_WINDOW = 5.0
+STREAM_HOP = 1.0
+STREAM_CONTEXT_CHARS = 200   # Хвост уже добавленного текста, передаваемый как initial_prompt
+
+# Период обработки очереди обновлений интерфейса, мс (10 Гц)
+UI_PUMP_INTERVAL = 100
+
+# Порог вероятности речи Silero VAD, ниже которого фрагмент не отправляется в Whisper
+VAD_THRESHOLD = 0.5
+_silero_vad = None  # (модель, get_speech_timestamps) для openai-whisper; False, если VAD недоступен
+
+def decode_device_name(name):
+    """Исправляет имя устройства, которое PortAudio отдаёт как UTF-8, прочитанный в cp1251"""
+    try:
+        return name.encode('cp1251').decode('utf-8')
+    except UnicodeError:
+        # Имя уже корректно или содержит символы вне cp1251 — оставляем как есть
+        return name
+
+
 # Проверка корректности установки PyAudio
 try:
     import pyaudio
     logger.info("PyAudio успешно импортирован")
-    
-    # Проверка доступности устройств ввода
-    audio = pyaudio.PyAudio()
-    device_count = audio.get_device_count()
-    logger.info(f"Найдено {device_count} аудиоустройств")
-    
-    # Поиск доступных устройств ввода
-    input_devices = []
-    for i in range(device_count):
-        info = audio.get_device_info_by_index(i)
-        if info['maxInputChannels'] > 0:  # Устройство поддерживает ввод
-            input_devices.append((i, info['name']))
-    
+except ImportError:
+    logger.error("PyAudio не установлен или не может быть импортирован")
+    raise
+
+# Проверка наличия ffmpeg поиском по PATH, без запуска процесса: аудио передаётся
+# в Whisper массивом, поэтому он больше не обязателен
+_FFMPEG = shutil.which('ffmpeg')
+if _FFMPEG is not None:
+    logger.info(f"ffmpeg найден: {_FFMPEG}")
+else:
+    logger.info("ffmpeg не найден; для распознавания с микрофона он не требуется")
+
+
+@functools.lru_cache(maxsize=1)
+def get_pyaudio():
+    """Единственный экземпляр PyAudio на всё время работы, создаваемый при первом обращении"""
+    # Инициализация PortAudio сканирует все host API, поэтому не выполняется при импорте модуля
+    return pyaudio.PyAudio()
+
+
+@functools.lru_cache(maxsize=1)
+def probe_input_devices():
+    """Перечисляет устройства ввода при первом обращении (результат кэшируется для интерфейса и записи)"""
+    try:
+        pa = get_pyaudio()
+        device_count = pa.get_device_count()
+        logger.info(f"Найдено {device_count} аудиоустройств")
+
+        input_devices = []
+        for i in range(device_count):
+            info = pa.get_device_info_by_index(i)
+            if info['maxInputChannels'] > 0:  # Устройство поддерживает ввод
+                input_devices.append((i, decode_device_name(info['name'])))
+    except Exception as e:
+        logger.error(f"Ошибка при проверке PyAudio: {e}")
+        raise
+
     logger.info(f"Найдено {len(input_devices)} устройств ввода")
     for device_id, name in input_devices:
-        logger.info(f"  Устройство ввода {device_id}: {name.encode('cp1251').decode('utf-8')}")
-    
-    audio.terminate()
-    
-    if len(input_devices) == 0:
+        logger.info(f"  Устройство ввода {device_id}: {name}")
+
+    if not input_devices:
         logger.warning("Не найдено устройств ввода звука")
     else:
         logger.info("PyAudio корректно установлен и настроен")
-    
-    # Проверка наличия ffmpeg
-    try:
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        logger.info("ffmpeg успешно найден")
-    except (subprocess.SubprocessError, FileNotFoundError):
-        logger.warning("ffmpeg не найден. Whisper может не работать корректно. Установите ffmpeg для корректной работы программы.")
-        
-except ImportError:
-    logger.error("PyAudio не установлен или не может быть импортирован")
-    raise
-except Exception as e:
-    logger.error(f"Ошибка при проверке PyAudio: {e}")
-    raise
+    return tuple(input_devices)
+
+
+def detect_compute_device():
+    """Определяет самое быстрое доступное устройство для инференса"""
+    if WHISPER_BACKEND == "faster-whisper":
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def resolve_compute_type(compute_type, device):
+    """Заменяет "auto" самым быстрым типом для устройства: int8 на CPU, int8_float16 на GPU"""
+    if compute_type != "auto":
+        return compute_type
+    return "int8" if device in ("cpu", "onnx") else "int8_float16"
+
+
+def load_whisper_model(model_name, compute_type=DEFAULT_COMPUTE_TYPE, device=DEFAULT_COMPUTE_DEVICE):
+    """Загружает модель Whisper с заданным типом вычислений на выбранное устройство"""
+    if device == "auto":
+        device = detect_compute_device()
+    compute_type = resolve_compute_type(compute_type, device)
+    logger.info(f"Устройство вычислений для модели {model_name}: {device}, тип вычислений: {compute_type}")
+    if device == "onnx":
+        model = OnnxWhisperModel(model_name, quantize=compute_type.startswith("int8"))
+    elif WHISPER_BACKEND == "faster-whisper":
+        # CTranslate2 сам подберёт ближайший поддерживаемый тип, если устройство не умеет float16
+        model = WhisperModel(model_name, device=device, compute_type=compute_type, cpu_threads=INFERENCE_THREADS)
+    else:
+        # Загрузка идёт в фоновом потоке, где autograd включён: не строим граф для весов.
+        # no_grad, а не inference_mode — иначе веса стали бы inference-тензорами
+        with torch.no_grad():
+            model = whisper.load_model(model_name, device=device)
+            if device == "cpu" and compute_type.startswith("int8"):
+                model = quantize_whisper_model(model)
+    warmup_model(model)
+    return model
+
+
+def quantize_whisper_model(model):
+    """Динамически квантует линейные слои openai-whisper в int8 для инференса на CPU"""
+    # Подкласс Linear из whisper лишь приводит веса к типу входа (на CPU всегда float32),
+    # а quantize_dynamic принимает только обычный nn.Linear
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    # Веса упаковываются под активный движок: x86/fbgemm на x86-64, qnnpack на ARM
+    engines = torch.backends.quantized.supported_engines
+    is_arm = platform.machine().lower() in ("arm64", "aarch64")
+    for engine in (("qnnpack",) if is_arm else ("x86", "fbgemm")):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            break
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    logger.info(f"Линейные слои модели квантованы в int8 (движок {torch.backends.quantized.engine})")
+    return model
+
+
+class OnnxWhisperModel:
+    """Whisper из Hugging Face, исполняемый ONNX Runtime через optimum"""
+    ONNX_FILES = ("encoder_model", "decoder_model", "decoder_with_past_model")
+    WINDOW_SAMPLES = 30 * WHISPER_SAMPLE_RATE  # Окно Whisper
+
+    def __init__(self, model_name, quantize=True):
+        model_id = f"openai/whisper-{model_name}"
+        model_dir = os.path.join(ONNX_CACHE_DIR, f"whisper-{model_name}")
+        if not os.path.isdir(model_dir):
+            logger.info(f"Экспорт {model_id} в ONNX (выполняется один раз)...")
+            ORTModelForSpeechSeq2Seq.from_pretrained(model_id, export=True).save_pretrained(model_dir)
+
+        suffix = ""
+        if quantize:
+            suffix = "_quantized"
+            # Динамическое int8-квантование весов каждой части модели
+            qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            for name in self.ONNX_FILES:
+                source = os.path.join(model_dir, f"{name}.onnx")
+                if os.path.exists(source) and not os.path.exists(os.path.join(model_dir, f"{name}{suffix}.onnx")):
+                    quantizer = ORTQuantizer.from_pretrained(model_dir, file_name=f"{name}.onnx")
+                    quantizer.quantize(save_dir=model_dir, quantization_config=qconfig)
+
+        # Без явных настроек ONNX Runtime занимает все ядра, а не INFERENCE_THREADS
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = INFERENCE_THREADS
+        session_options.inter_op_num_threads = 1
+
+        self.processor = WhisperProcessor.from_pretrained(model_id)
+        self.model = ORTModelForSpeechSeq2Seq.from_pretrained(
+            model_dir,
+            encoder_file_name=f"encoder_model{suffix}.onnx",
+            decoder_file_name=f"decoder_model{suffix}.onnx",
+            decoder_with_past_file_name=f"decoder_with_past_model{suffix}.onnx",
+            provider="CPUExecutionProvider",
+            session_options=session_options
+        )
+
+    def transcribe(self, audio, language, initial_prompt=None, beam_size=BEAM_SIZE_FAST):
+        """Распознаёт массив float32 16 кГц и возвращает текст"""
+        # Процессор обрезает вход до 30 с, поэтому длинное аудио распознаётся окнами по 30 с
+        texts = []
+        for start in range(0, len(audio), self.WINDOW_SAMPLES):
+            window = audio[start:start + self.WINDOW_SAMPLES]
+            texts.append(self.transcribe_window(window, language, initial_prompt if not start else None, beam_size))
+        return " ".join(text.strip() for text in texts if text.strip())
+
+    def transcribe_window(self, audio, language, initial_prompt=None, beam_size=BEAM_SIZE_FAST):
+        """Распознаёт одно окно не длиннее 30 с"""
+        features = self.processor(audio, sampling_rate=WHISPER_SAMPLE_RATE, return_tensors="pt").input_features
+        options = {"language": language, "task": "transcribe", "num_beams": beam_size}
+        if initial_prompt:
+            options["prompt_ids"] = self.processor.get_prompt_ids(initial_prompt, return_tensors="pt")
+        token_ids = self.model.generate(features, **options)
+        return self.processor.batch_decode(token_ids, skip_special_tokens=True)[0]
+
+
+def warmup_model(model):
+    """Прогоняет секунду тишины через модель, чтобы первая фраза пользователя не платила за инициализацию ядер"""
+    dummy = np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32)
+    started = time.perf_counter()
+    if isinstance(model, OnnxWhisperModel):
+        model.transcribe(dummy, "en")
+    elif WHISPER_BACKEND == "faster-whisper":
+        # Без VAD, иначе тишина будет отброшена до энкодера; сегменты вычисляются лениво
+        segments, _ = model.transcribe(dummy, language="en", vad_filter=False, beam_size=BEAM_SIZE_FAST)
+        for _ in segments:
+            pass
+    else:
+        with torch.inference_mode():
+            model.transcribe(dummy, language="en", fp16=model.device.type != "cpu")
+    logger.info(f"Прогрев модели занял {time.perf_counter() - started:.2f} с")
+
+
+def resample_to_whisper_rate(samples, sample_rate):
+    """Передискретизирует float32-сигнал в 16 кГц (soxr или полифазный фильтр scipy)"""
+    if sample_rate == WHISPER_SAMPLE_RATE:
+        return samples
+    if soxr is not None:
+        return soxr.resample(samples, sample_rate, WHISPER_SAMPLE_RATE, quality='MQ')
+    # Сокращаем дробь, чтобы фильтр был минимальной длины (48000 -> 16000 = 1/3)
+    divisor = math.gcd(WHISPER_SAMPLE_RATE, sample_rate)
+    resampled = resample_poly(samples, WHISPER_SAMPLE_RATE // divisor, sample_rate // divisor)
+    return resampled.astype(np.float32, copy=False)
+
+
+def pcm16_to_samples(pcm, sample_rate, out=None):
+    """Преобразует 16-битный PCM в массив float32 16 кГц, который Whisper принимает напрямую"""
+    pcm = np.frombuffer(pcm, dtype=np.int16)
+    # Если передан достаточно большой буфер, результат пишется в него без новой аллокации
+    if out is not None and out.size >= pcm.size:
+        out = out[:pcm.size]
+    else:
+        out = None
+    # Приведение int16 -> float32 и масштабирование за один векторизованный проход, без промежуточного массива
+    samples = np.multiply(pcm, PCM16_SCALE, out=out, dtype=np.float32)
+    return resample_to_whisper_rate(samples, sample_rate)
+
+
+def pcm16_energy(pcm):
+    """Среднеквадратичная энергия 16-битного PCM-буфера (в тех же единицах, что и порог чувствительности)"""
+    pcm = np.frombuffer(pcm, dtype=np.int16)
+    if not pcm.size:
+        return 0.0
+    return float(np.sqrt(np.mean(np.square(pcm, dtype=np.float64))))
+
+
+def pcm16_has_speech(vad, pcm, sample_rate, frame_bytes):
+    """Проверяет через webrtcvad, что речь есть хотя бы в половине кадров буфера"""
+    frames = len(pcm) // frame_bytes
+    voiced = sum(
+        vad.is_speech(pcm[i * frame_bytes:(i + 1) * frame_bytes], sample_rate)
+        for i in range(frames)
+    )
+    return voiced * 2 >= frames
+
+
+def decode_whisper_window(model, audio, language, initial_prompt=None, beam_size=BEAM_SIZE_FAST):
+    """Распознаёт фразу не длиннее 30 с одним вызовом whisper.decode, минуя цикл окон transcribe"""
+    # transcribe строит мел-спектрограмму по аудио с приклеенными 30 с тишины и гоняет цикл
+    # по окнам с откатом температуры; фразе хватает одного окна. Короче 30 с сделать окно нельзя:
+    # энкодер openai-whisper принимает ровно 3000 мел-кадров
+    audio = whisper.pad_or_trim(torch.from_numpy(audio))
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels).to(model.device)
+    options = whisper.DecodingOptions(
+        language=language,
+        prompt=initial_prompt,
+        fp16=model.device.type != "cpu",
+        beam_size=beam_size if beam_size > 1 else None,
+        temperature=DECODE_OPTIONS["temperature"],
+        without_timestamps=DECODE_OPTIONS["without_timestamps"]
+    )
+    result = whisper.decode(model, mel, options)
+    # Та же проверка на тишину, что в transcribe (порог средней логвероятности там по умолчанию -1)
+    if result.no_speech_prob > DECODE_OPTIONS["no_speech_threshold"] and result.avg_logprob < -1.0:
+        return ""
+    return result.text
+
+
+def transcribe_with_model(model, audio, language, initial_prompt=None, beam_size=BEAM_SIZE_FAST):
+    """Распознаёт аудио (массив float32 16 кГц) и возвращает текст"""
+    if isinstance(model, OnnxWhisperModel):
+        return model.transcribe(audio, language, initial_prompt, beam_size)
+    if WHISPER_BACKEND == "faster-whisper":
+        # faster-whisper возвращает ленивый итератор сегментов; VAD отсекает тишину внутри фразы
+        segments, _ = model.transcribe(
+            audio,
+            language=language,
+            vad_filter=True,
+            beam_size=beam_size,
+            initial_prompt=initial_prompt,
+            **DECODE_OPTIONS
+        )
+        return "".join(segment.text for segment in segments)
+    # Режим autograd локален для потока, поэтому inference_mode включается на каждый вызов
+    # из потока распознавания; на GPU openai-whisper считает в float16, на CPU float16 не поддерживается
+    if len(audio) <= whisper.audio.N_SAMPLES:
+        with torch.inference_mode():
+            return decode_whisper_window(model, audio, language, initial_prompt, beam_size)
+    with torch.inference_mode():
+        result = model.transcribe(
+            audio,
+            language=language,
+            initial_prompt=initial_prompt,
+            fp16=model.device.type != "cpu",
+            # В openai-whisper beam_size=None — жадный декодер, а 1 включил бы лучевой поиск
+            beam_size=beam_size if beam_size > 1 else None,
+            **DECODE_OPTIONS
+        )
+    return result['text']
+
+
+class Win32Clipboard:
+    """Запись текста в буфер обмена Windows напрямую через user32/kernel32"""
+    CF_UNICODETEXT = 13
+    GMEM_MOVEABLE = 0x0002
+    OPEN_ATTEMPTS = 5  # Буфер обмена может быть кратковременно занят другим приложением
+
+    def __init__(self, hwnd):
+        from ctypes import wintypes
+        # Окно-владелец: после OpenClipboard(NULL) вызов EmptyClipboard приводит к отказу SetClipboardData
+        self._hwnd = hwnd
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
 
+        # Адреса процедур и их сигнатуры определяются один раз
+        self._open_clipboard = user32.OpenClipboard
+        self._open_clipboard.argtypes = [wintypes.HWND]
+        self._open_clipboard.restype = wintypes.BOOL
+        self._empty_clipboard = user32.EmptyClipboard
+        self._empty_clipboard.restype = wintypes.BOOL
+        self._set_clipboard_data = user32.SetClipboardData
+        self._set_clipboard_data.argtypes = [wintypes.UINT, wintypes.HANDLE]
+        self._set_clipboard_data.restype = wintypes.HANDLE
+        self._close_clipboard = user32.CloseClipboard
+        self._close_clipboard.restype = wintypes.BOOL
+        self._global_alloc = kernel32.GlobalAlloc
+        self._global_alloc.argtypes = [wintypes.UINT, ctypes.c_size_t]
+        self._global_alloc.restype = wintypes.HGLOBAL
+        self._global_lock = kernel32.GlobalLock
+        self._global_lock.argtypes = [wintypes.HGLOBAL]
+        self._global_lock.restype = wintypes.LPVOID
+        self._global_unlock = kernel32.GlobalUnlock
+        self._global_unlock.argtypes = [wintypes.HGLOBAL]
+        self._global_free = kernel32.GlobalFree
+        self._global_free.argtypes = [wintypes.HGLOBAL]
 
-class SafeMicrophone(sr.Microphone):
-    """Обертка для безопасного использования микрофона"""
-    def __enter__(self):
+    def copy(self, text):
+        """Помещает текст в буфер обмена в формате CF_UNICODETEXT"""
+        data = text.encode('utf-16-le') + b'\x00\x00'
+        handle = self._global_alloc(self.GMEM_MOVEABLE, len(data))
+        if not handle:
+            raise ctypes.WinError(ctypes.get_last_error())
+        pointer = self._global_lock(handle)
+        if not pointer:
+            error = ctypes.get_last_error()
+            self._global_free(handle)
+            raise ctypes.WinError(error)
+        ctypes.memmove(pointer, data, len(data))
+        self._global_unlock(handle)
+
+        for _ in range(self.OPEN_ATTEMPTS):
+            if self._open_clipboard(self._hwnd):
+                break
+            time.sleep(0.01)
+        else:
+            self._global_free(handle)
+            raise ctypes.WinError(ctypes.get_last_error())
         try:
-            return super().__enter__()
-        except Exception as e:
-            logger.error(f"Ошибка при входе в контекст микрофона: {e}")
-            raise
-    
-    def __exit__(self, exc_type, exc_value, traceback):
+            self._empty_clipboard()
+            # После успешного SetClipboardData памятью владеет система
+            if not self._set_clipboard_data(self.CF_UNICODETEXT, handle):
+                self._global_free(handle)
+                raise ctypes.WinError(ctypes.get_last_error())
+        finally:
+            self._close_clipboard()
+
+
+def set_clipboard_text(text, win32_clipboard=None):
+    """Копирует текст в буфер обмена: на Windows через Win32 API, иначе через pyperclip"""
+    if win32_clipboard is not None:
         try:
-            # Проверяем, что объект источника существует и имеет метод close
-            if hasattr(self, 'stream') and self.stream:
-                try:
-                    self.stream.close()
-                except Exception:
-                    pass  # Игнорируем ошибки при закрытии
-            return super().__exit__(exc_type, exc_value, traceback)
+            win32_clipboard.copy(text)
+            return
+        except OSError as e:
+            logger.warning(f"Ошибка записи в буфер обмена Windows, используется pyperclip: {e}")
+    pyperclip.copy(text)
+
+
+def load_silero_vad():
+    """Однократно загружает Silero VAD через torch.hub (для openai-whisper и ONNX)"""
+    global _silero_vad
+    if _silero_vad is None:
+        try:
+            model, utils = torch.hub.load('snakers4/silero-vad', 'silero_vad')
+            _silero_vad = (model, utils[0])
+            logger.info("Silero VAD загружен")
         except Exception as e:
-            logger.error(f"Ошибка при выходе из контекста микрофона: {e}")
-            # Не пробрасываем исключение, чтобы не прерывать нормальное завершение
+            logger.warning(f"Silero VAD недоступен, фильтрация тишины отключена: {e}")
+            _silero_vad = False
+    return _silero_vad
+
+
+def contains_speech(samples, model):
+    """Проверяет, есть ли во фрагменте речь, до запуска модели"""
+    # У ONNX-модели нет ни VAD, ни проверки на тишину, поэтому она проверяется всегда
+    if WHISPER_BACKEND == "faster-whisper" and not isinstance(model, OnnxWhisperModel):
+        # faster-whisper с vad_filter=True сам прогоняет Silero VAD и не запускает модель на тишине
+        return True
+    vad = load_silero_vad()
+    if not vad:
+        return True
+    model, get_speech_timestamps = vad
+    with torch.inference_mode():
+        timestamps = get_speech_timestamps(
+            torch.from_numpy(samples),
+            model,
+            threshold=VAD_THRESHOLD,
+            sampling_rate=WHISPER_SAMPLE_RATE
+        )
+    return bool(timestamps)
+
+
+# Состояние дочернего процесса распознавания (режим "Отдельный процесс")
+_worker_model = None
+_worker_models = collections.OrderedDict()  # LRU-кэш моделей дочернего процесса
+
+
+def _worker_init(model_name, compute_type, device):
+    """Инициализатор дочернего процесса: один раз загружает модель"""
+    _worker_use_model(model_name, compute_type, device)
+
+
+def _worker_use_model(model_name, compute_type, device):
+    """Переключает модель дочернего процесса, загружая её только при первом обращении"""
+    global _worker_model
+    key = (model_name, compute_type, device)
+    model = _worker_models.pop(key, None)
+    if model is None:
+        model = load_whisper_model(model_name, compute_type, device)
+    _worker_models[key] = model
+    while len(_worker_models) > MODEL_CACHE_SIZE:
+        _worker_models.popitem(last=False)
+    _worker_model = model
+
+
+def _worker_ping():
+    """Пустая задача, чтобы запустить процесс и загрузку модели заранее"""
+    return True
+
+
+def _worker_transcribe(samples, language, initial_prompt=None, beam_size=BEAM_SIZE_FAST):
+    """Распознавание в дочернем процессе; GIL главного процесса остаётся свободным"""
+    return transcribe_with_model(_worker_model, samples, language, initial_prompt, beam_size)
+
+
+def put_latest(q, item):
+    """Кладёт элемент в очередь на один элемент, вытесняя ещё не взятый"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def common_prefix_length(words, other_words):
+    """Длина общего начала двух списков слов без учёта регистра и пунктуации"""
+    length = 0
+    for word, other_word in zip(words, other_words):
+        if word.strip(".,!?;:…\"'").lower() != other_word.strip(".,!?;:…\"'").lower():
+            break
+        length += 1
+    return length
 
 
 class VoiceTranscriberApp:
@@ -95,9 +631,25 @@ class VoiceTranscriberApp:
         self.root.resizable(True, True)
 
         self.is_recording = False
-        self.recognizer = sr.Recognizer()
         # Устанавливаем начальный порог чувствительности
-        self.recognizer.energy_threshold = 400  # Можно настроить под конкретную среду
+        self.energy_threshold = 400  # Можно настроить под конкретную среду
+        # Откалиброванные пороги по устройствам: {id устройства: (чувствительность, порог)}
+        self._calibrated_devices = {}
+
+        # Постоянный аудиопоток и очередь буферов, заполняемая из его callback
+        self._stream = None
+        self._stream_rate = WHISPER_SAMPLE_RATE
+        self._audio_q = queue.Queue()
+
+        # Пул байтовых буферов для накопления фраз
+        self._buf_pool = collections.deque()
+        # Переиспользуемый буфер float32 для синхронного распознавания в потоке transcribe_loop
+        self._samples_buf = np.empty(SAMPLES_BUFFER_SIZE, dtype=np.float32)
+
+        # Состояние потокового режима: гипотеза текущего окна и контекст для следующих окон
+        self._stream_hypothesis = []
+        self._stream_committed = 0
+        self._stream_context = ""
         
         # Получение списка устройств ввода
         self.input_devices = self.get_input_devices()
@@ -105,12 +657,44 @@ class VoiceTranscriberApp:
         
         # Инициализация модели Whisper
         self.available_models = ["tiny", "base", "small", "medium", "large"]
-        self.whisper_model = whisper.load_model("base")  # Модель по умолчанию
+        self._model_cache = collections.OrderedDict()  # LRU-кэш загруженных моделей
+        self._model_lock = threading.Lock()  # Загрузка и работа с кэшем
+        self._active_model_lock = threading.Lock()  # Смена активной модели и её ключа одной парой
+        self._model_key = ("base", DEFAULT_COMPUTE_TYPE, DEFAULT_COMPUTE_DEVICE)
+        self.whisper_model = None  # Модель по умолчанию загружается в фоне после отрисовки окна
+        self._model_ready = threading.Event()
+        # Один фоновый поток на все загрузки моделей; в очереди только последний выбор,
+        # так что промежуточные модели при быстром переключении не загружаются
+        self._load_q = queue.Queue(maxsize=1)
+        threading.Thread(target=self.model_loader_loop, daemon=True).start()
+
+        # Пул из одного дочернего процесса для распознавания (включается в интерфейсе)
+        self._exec = None
+        self._exec_lock = threading.Lock()
         
-        # Буфер для аудио данных
-        self.audio_buffer = []
+        # Потоки текущей сессии записи; фразы распознаются по ходу записи
+        self.record_thread = None
+        self._transcribe_thread = None
+
+        # Очередь обновлений интерфейса из рабочих потоков (Tk не потокобезопасен)
+        self._ui_q = queue.Queue()
+
+        # Текст поля хранится отдельно, чтобы не читать весь виджет Tk при каждом добавлении
+        self._full_text = []
+        self._text_len = 0
+
+        # Запись в буфер обмена в отдельном потоке; в очереди только последний текст.
+        # Буфер обмена открывается от имени окна приложения (его HWND берётся в главном потоке)
+        self._win32_clipboard = Win32Clipboard(self.root.winfo_id()) if sys.platform == "win32" else None
+        self._clip_q = queue.Queue(maxsize=1)
+        threading.Thread(target=self.clipboard_loop, daemon=True).start()
 
         self.setup_ui()
+        self.root.after(UI_PUMP_INTERVAL, self._pump_ui)
+
+        # Окно показывается сразу; записывать можно уже во время загрузки модели,
+        # фразы дождутся её в потоке распознавания
+        put_latest(self._load_q, self._model_key)
 
     def setup_ui(self):
         # Основной фрейм
@@ -119,7 +703,7 @@ class VoiceTranscriberApp:
         
         # Настройка сетки
         main_frame.columnconfigure(0, weight=1)
-        main_frame.rowconfigure(11, weight=1)  # Для текстового поля
+        main_frame.rowconfigure(10, weight=1)  # Для текстового поля
 
         # Заголовок (занимает всю ширину)
         title_label = ttk.Label(
@@ -184,11 +768,14 @@ class VoiceTranscriberApp:
         language_combo = ttk.Combobox(
             main_frame,
             textvariable=self.language_var,
-            values=["ru-RU", "en-US", "de-DE", "fr-FR", "es-ES"],
+            values=list(GOOGLE_TO_WHISPER_LANGUAGE),
             state="readonly",
             width=10
         )
         language_combo.grid(row=3, column=1, sticky="w", padx=2, pady=2)
+        # Код Whisper хранится готовым: поток распознавания не обращается к переменной Tk
+        self._whisper_language = GOOGLE_TO_WHISPER_LANGUAGE[self.language_var.get()]
+        self.language_var.trace_add('write', self.on_language_changed)
 
         # Автокопирование (в той же строке, что и язык)
         self.auto_copy_var = tk.BooleanVar(value=True)
@@ -199,11 +786,14 @@ class VoiceTranscriberApp:
         )
         auto_copy_check.grid(row=3, column=2, sticky="w", padx=2, pady=2)
 
+        # Потоковый режим: текст появляется во время фразы, а не после паузы
+        self.streaming_var = tk.BooleanVar(value=False)
+
         # Устройство ввода (в одной строке)
         ttk.Label(main_frame, text="Устройство ввода:").grid(row=4, column=0, sticky="w", padx=2, pady=2)
         
         # Подготовка значений для комбобокса (форматируем названия устройств)
-        device_values = [f"{device_id}: {name.encode('cp1251').decode('utf-8')}" for device_id, name in self.input_devices]
+        device_values = [f"{device_id}: {name}" for device_id, name in self.input_devices]
         if not device_values:
             device_values = ["Нет доступных устройств"]
         
@@ -221,9 +811,17 @@ class VoiceTranscriberApp:
             state="readonly",
             width=30
         )
-        self.device_combo.grid(row=4, column=1, columnspan=2, sticky="ew", padx=2, pady=2)
+        self.device_combo.grid(row=4, column=1, sticky="ew", padx=2, pady=2)
         self.device_combo.bind("<<ComboboxSelected>>", self.on_device_selected)
 
+        # Калибровка кэшируется между сессиями; кнопка сбрасывает её для выбранного устройства
+        recalibrate_btn = ttk.Button(
+            main_frame,
+            text="Калибровать",
+            command=self.recalibrate
+        )
+        recalibrate_btn.grid(row=4, column=2, sticky="ew", padx=2, pady=2)
+
         # Чувствительность микрофона (в одной строке)
         ttk.Label(main_frame, text="Чувствительность:").grid(row=5, column=0, sticky="w", padx=2, pady=2)
         
@@ -258,12 +856,71 @@ class VoiceTranscriberApp:
         model_combo.grid(row=6, column=1, sticky="w", padx=2, pady=2)
         model_combo.bind("<<ComboboxSelected>>", self.on_model_selected)
 
+        streaming_check = ttk.Checkbutton(
+            main_frame,
+            text="Потоковый режим",
+            variable=self.streaming_var
+        )
+        streaming_check.grid(row=6, column=2, sticky="w", padx=2, pady=2)
+
+        # Тип вычислений модели (в одной строке)
+        ttk.Label(main_frame, text="Тип вычислений:").grid(row=7, column=0, sticky="w", padx=2, pady=2)
+
+        self.compute_type_var = tk.StringVar(value=DEFAULT_COMPUTE_TYPE)
+        compute_type_combo = ttk.Combobox(
+            main_frame,
+            textvariable=self.compute_type_var,
+            values=COMPUTE_TYPES,
+            state="readonly",
+            width=12
+        )
+        compute_type_combo.grid(row=7, column=1, sticky="w", padx=2, pady=2)
+        # Смена типа вычислений требует перезагрузки модели
+        compute_type_combo.bind("<<ComboboxSelected>>", self.on_model_selected)
+
+        # Распознавание в дочернем процессе, чтобы Whisper не конкурировал за GIL с интерфейсом и захватом звука
+        self.separate_process_var = tk.BooleanVar(value=False)
+        separate_process_check = ttk.Checkbutton(
+            main_frame,
+            text="Отдельный процесс",
+            variable=self.separate_process_var,
+            command=self.on_separate_process_toggled
+        )
+        separate_process_check.grid(row=7, column=2, sticky="w", padx=2, pady=2)
+
+        # Устройство вычислений (в одной строке)
+        ttk.Label(main_frame, text="Устройство вычислений:").grid(row=8, column=0, sticky="w", padx=2, pady=2)
+
+        self.compute_device_var = tk.StringVar(value=DEFAULT_COMPUTE_DEVICE)
+        compute_device_combo = ttk.Combobox(
+            main_frame,
+            textvariable=self.compute_device_var,
+            values=COMPUTE_DEVICES,
+            state="readonly",
+            width=12
+        )
+        compute_device_combo.grid(row=8, column=1, sticky="w", padx=2, pady=2)
+        # Смена устройства также требует перезагрузки модели
+        compute_device_combo.bind("<<ComboboxSelected>>", self.on_model_selected)
+
+        # Лучевой поиск вместо жадного декодирования: немного точнее, но в несколько раз медленнее
+        self.accurate_var = tk.BooleanVar(value=False)
+        accurate_check = ttk.Checkbutton(
+            main_frame,
+            text="Точное распознавание",
+            variable=self.accurate_var
+        )
+        accurate_check.grid(row=8, column=2, sticky="w", padx=2, pady=2)
+        # Как и язык, ширина луча хранится готовой для потока распознавания
+        self._beam_size = BEAM_SIZE_FAST
+        self.accurate_var.trace_add('write', self.on_accuracy_changed)
+
         # Пустая строка для разделения
-        ttk.Separator(main_frame, orient="horizontal").grid(row=7, column=0, columnspan=3, sticky="ew", pady=5)
+        ttk.Separator(main_frame, orient="horizontal").grid(row=9, column=0, columnspan=3, sticky="ew", pady=5)
 
         # Текстовое поле для результата (занимает оставшееся пространство)
         text_frame = ttk.LabelFrame(main_frame, text="Распознанный текст")
-        text_frame.grid(row=8, column=0, columnspan=3, sticky="nsew", pady=5)
+        text_frame.grid(row=10, column=0, columnspan=3, sticky="nsew", pady=5)
         text_frame.columnconfigure(0, weight=1)
         text_frame.rowconfigure(0, weight=1)
 
@@ -278,6 +935,8 @@ class VoiceTranscriberApp:
         )
         self.text_area.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
         scrollbar.config(command=self.text_area.yview)
+        # Правки пользователя в поле синхронизируются с хранимой копией текста
+        self.text_area.bind("<<Modified>>", self.on_text_modified)
 
     def toggle_recording(self):
         if self.is_recording:
@@ -286,12 +945,20 @@ class VoiceTranscriberApp:
             self.start_recording()
 
     def start_recording(self):
-        # Проверка возможности создания микрофона с выбранным устройством
+        # Устройства перечислены при запуске: без них не пытаемся открывать поток
+        if not self.input_devices:
+            messagebox.showerror(
+                "Ошибка",
+                "Не найдено устройств ввода звука.\n\nУбедитесь, что микрофон подключен и доступен."
+            )
+            return
+
+        # Открываем один поток с микрофона на всю сессию записи
         try:
-            test_microphone = SafeMicrophone(device_index=self.selected_device_id)
-            del test_microphone  # Удаляем временный объект
+            self.open_stream()
         except Exception as e:
             logger.error(f"Ошибка инициализации микрофона: {e}")
+            self.close_stream()
             messagebox.showerror(
                 "Ошибка",
                 f"Ошибка инициализации микрофона: {e}\n\nУбедитесь, что микрофон подключен и доступен."
@@ -303,293 +970,494 @@ class VoiceTranscriberApp:
         self.indicator_canvas.itemconfig(self.indicator, fill="red")
         self.status_var.set("Запись... Говорите в микрофон")
 
-        # Очистка аудио буфера перед началом новой записи
-        self.audio_buffer = []
-
-        # Запуск в отдельном потоке
-        self.record_thread = threading.Thread(target=self.record_audio, daemon=True)
+        # Запуск в отдельном потоке; поток распознавания этой сессии создаст запись.
+        # Настройки читаются здесь: переменные Tk можно трогать только из главного потока
+        self._transcribe_thread = None
+        self.record_thread = threading.Thread(
+            target=self.record_audio,
+            args=(int(self.sensitivity_var.get()), self.streaming_var.get()),
+            daemon=True
+        )
         self.record_thread.start()
 
     def stop_recording(self):
-        self.is_recording = False
-        self.record_btn.config(text="Начать запись")
-        self.indicator_canvas.itemconfig(self.indicator, fill="gray")
+        self.stop_listening()
+        self.close_stream()
+        self.reset_record_controls()
         self.status_var.set("Готов к записи")
         
     def finish_recording(self):
-        self.is_recording = False
-        self.record_btn.config(text="Обработка...")
+        self.stop_listening()
+        # Микрофон закрывается сразу: уже снятые буферы стоят в очереди перед None,
+        # а распознавание оставшихся фраз может занять время
+        self.close_stream()
+        # Новая запись начнётся только после того, как старая сессия полностью обработана
+        self.record_btn.config(text="Обработка...", state="disabled")
         self.indicator_canvas.itemconfig(self.indicator, fill="yellow")
         self.status_var.set("Обработка записи...")
         
-        # Запуск транскрибации в отдельном потоке
-        transcribe_thread = threading.Thread(target=self.transcribe_audio_buffer, daemon=True)
-        transcribe_thread.start()
+        # Ожидание оставшихся фраз в отдельном потоке
+        threading.Thread(target=self.wait_session_end, daemon=True).start()
+
+    def reset_record_controls(self):
+        """Возвращает кнопку записи и индикатор в исходное состояние"""
+        self.record_btn.config(text="Начать запись", state="normal")
+        self.indicator_canvas.itemconfig(self.indicator, fill="gray")
 
-    def record_audio(self):
-        # Сначала выполним калибровку микрофона
-        self.status_var.set("Калибровка микрофона...")
+    def post_status(self, text):
+        """Передаёт новый статус из рабочего потока в очередь интерфейса"""
+        self._ui_q.put(("status", text))
+
+    def post_append(self, text):
+        """Передаёт распознанный текст из рабочего потока в очередь интерфейса"""
+        self._ui_q.put(("append", text))
+
+    def post_ui(self, func, *args):
+        """Передаёт произвольный вызов из рабочего потока в очередь интерфейса"""
+        self._ui_q.put(("call", func, args))
+
+    def post_clipboard(self, text):
+        """Передаёт текст потоку буфера обмена, заменяя ещё не записанный"""
+        put_latest(self._clip_q, text)
+
+    def clipboard_loop(self):
+        """Поток записи в буфер обмена: главный цикл Tk не ждёт OpenClipboard"""
+        while True:
+            text = self._clip_q.get()
+            try:
+                set_clipboard_text(text, self._win32_clipboard)
+            except Exception as e:
+                logger.warning(f"Не удалось записать текст в буфер обмена: {e}")
+
+    def _pump_ui(self):
+        """Раз в UI_PUMP_INTERVAL мс применяет накопленные обновления интерфейса в главном потоке"""
+        items = []
         try:
-            with sr.Microphone(device_index=self.selected_device_id) as source:
-                # Обновляем порог чувствительности до калибровки
-                self.update_energy_threshold()
-                self.recognizer.adjust_for_ambient_noise(source, duration=1.0)  # Увеличиваем время калибровки
-        except Exception as e:
-            logger.error(f"Ошибка калибровки микрофона: {e}")
-            self.root.after(
-                0,
+            while True:
+                items.append(self._ui_q.get_nowait())
+        except queue.Empty:
+            pass
+
+        try:
+            # Из нескольких статусов подряд показываем только последний
+            last_status = max((i for i, item in enumerate(items) if item[0] == "status"), default=-1)
+            # Подряд идущие фразы вставляются одним вызовом: одна вставка, прокрутка и автокопирование
+            pending = []
+            for i, item in enumerate(items):
+                kind = item[0]
+                if kind == "append":
+                    pending.append(item[1].strip())
+                    continue
+                if pending:
+                    self.append_text(" ".join(filter(None, pending)))
+                    pending = []
+                if kind == "status":
+                    if i == last_status:
+                        self.status_var.set(item[1])
+                else:
+                    _, func, args = item
+                    func(*args)
+            if pending:
+                self.append_text(" ".join(filter(None, pending)))
+        finally:
+            self.root.after(UI_PUMP_INTERVAL, self._pump_ui)
+
+    def get_stream_rate(self):
+        """Частота захвата: 16 кГц, если устройство её поддерживает, иначе родная частота устройства"""
+        pa = get_pyaudio()
+        if self.selected_device_id is None:
+            info = pa.get_default_input_device_info()
+        else:
+            info = pa.get_device_info_by_index(self.selected_device_id)
+        try:
+            pa.is_format_supported(
+                WHISPER_SAMPLE_RATE,
+                input_device=info['index'],
+                input_channels=1,
+                input_format=pyaudio.paInt16
+            )
+            return WHISPER_SAMPLE_RATE
+        except ValueError:
+            # Передискретизация в 16 кГц выполняется в процессе, без ffmpeg
+            native_rate = int(info['defaultSampleRate'])
+            logger.info(f"Устройство не поддерживает {WHISPER_SAMPLE_RATE} Гц, запись на {native_rate} Гц")
+            return native_rate
+
+    def open_stream(self):
+        """Открывает постоянный поток PyAudio, который складывает буферы в очередь"""
+        self._audio_q = queue.Queue()
+        self._stream_rate = self.get_stream_rate()
+        self._stream = get_pyaudio().open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self._stream_rate,
+            input=True,
+            frames_per_buffer=CHUNK_SIZE,
+            input_device_index=self.selected_device_id,
+            stream_callback=self._audio_callback
+        )
+
+    def stop_listening(self):
+        """Останавливает цикл записи, не дожидаясь очередного буфера от устройства"""
+        self.is_recording = False
+        self._audio_q.put(None)
+
+    def close_stream(self):
+        """Закрывает поток PyAudio (повторный вызов безопасен)"""
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            try:
+                stream.stop_stream()
+                stream.close()
+            except Exception:
+                pass  # Игнорируем ошибки при закрытии
+
+    def _audio_callback(self, in_data, frame_count, time_info, status):
+        """Callback PortAudio: только передаёт буфер в очередь, без обработки"""
+        self._audio_q.put_nowait(in_data)
+        return (None, pyaudio.paContinue)
+
+    def acquire_buf(self, size):
+        """Берёт из пула байтовый буфер не меньше size, чтобы не выделять память на каждую фразу"""
+        while self._buf_pool:
+            buf = self._buf_pool.pop()
+            if len(buf) >= size:
+                return buf
+        return bytearray(size)
+
+    def release_buf(self, buf):
+        """Возвращает буфер в пул для повторного использования"""
+        self._buf_pool.append(buf)
+
+    def calibrate_energy_threshold(self, duration):
+        """Подстраивает порог чувствительности под фоновый шум"""
+        seconds_per_chunk = CHUNK_SIZE / self._stream_rate
+        elapsed = 0.0
+        while elapsed < duration and self.is_recording:
+            # Если устройство не отдаёт данные, queue.Empty прерывает калибровку
+            chunk = self._audio_q.get(timeout=1.0)
+            if chunk is None:
+                break
+            self.adjust_energy_threshold(pcm16_energy(chunk), seconds_per_chunk)
+            elapsed += seconds_per_chunk
+
+    def adjust_energy_threshold(self, energy, seconds_per_chunk):
+        """Плавно сдвигает порог к уровню фонового шума"""
+        damping = DYNAMIC_ENERGY_DAMPING ** seconds_per_chunk
+        target_energy = energy * DYNAMIC_ENERGY_RATIO
+        self.energy_threshold = self.energy_threshold * damping + target_energy * (1 - damping)
+
+    def record_audio(self, sensitivity, streaming):
+        # Калибровка нужна только при первой записи с устройством или после смены чувствительности
+        device_id = self.selected_device_id
+        cached = self._calibrated_devices.get(device_id)
+        try:
+            if cached is not None and cached[0] == sensitivity:
+                self.energy_threshold = cached[1]
+                logger.info(f"Порог чувствительности {self.energy_threshold:.0f} взят из предыдущей калибровки")
+            else:
+                # Сначала выполним калибровку микрофона
+                self.post_status("Калибровка микрофона...")
+                # Калибровка начинается с порога, выбранного ползунком
+                self.energy_threshold = sensitivity
+                self.calibrate_energy_threshold(CALIBRATION_DURATION)
+                self._calibrated_devices[device_id] = (sensitivity, self.energy_threshold)
+        except queue.Empty:
+            logger.error("Ошибка калибровки микрофона: нет данных от аудиоустройства")
+            self.post_ui(
                 messagebox.showerror,
                 "Ошибка",
-                f"Ошибка калибровки микрофона: {e}"
+                "Ошибка калибровки микрофона: нет данных от аудиоустройства"
             )
-            self.root.after(0, self.stop_recording)
+            self.post_ui(self.stop_recording)
             return
 
+        sample_rate = self._stream_rate
+        seconds_per_chunk = CHUNK_SIZE / sample_rate
+        pause_chunks = math.ceil(PAUSE_THRESHOLD / seconds_per_chunk)
+        phrase_chunks = math.ceil(PHRASE_THRESHOLD / seconds_per_chunk)
+        max_chunks = math.ceil(PHRASE_TIME_LIMIT / seconds_per_chunk)
+
+        # В потоковом режиме фраза режется на окна, а внутри окна текст выдаётся каждую секунду
+        window_chunks = math.ceil(STREAM_WINDOW / seconds_per_chunk) if streaming else max_chunks
+        hop_chunks = math.ceil(STREAM_HOP / seconds_per_chunk)
+        self.reset_stream_state()
+
+        # Громкие буферы дополнительно проверяются webrtcvad, чтобы шум не продлевал фразу
+        frame_vad = None
+        frame_bytes = sample_rate * WEBRTC_FRAME_MS // 1000 * 2
+        if webrtcvad is not None and sample_rate in WEBRTC_SAMPLE_RATES and frame_bytes <= CHUNK_SIZE * 2:
+            frame_vad = webrtcvad.Vad(WEBRTC_VAD_MODE)
+
+        # Конвейер: этот поток только слушает, фразы распознаются в отдельном потоке
+        # Очередь принадлежит сессии: поток распознавания прошлой записи не возьмёт фразы новой
+        utterance_q = queue.Queue(maxsize=UTTERANCE_QUEUE_SIZE)
+        self._transcribe_thread = threading.Thread(target=self.transcribe_loop, args=(utterance_q,), daemon=True)
+        self._transcribe_thread.start()
+
+        # Кольцевой буфер тишины перед фразой и накопитель текущей фразы из пула
+        preroll = collections.deque(maxlen=math.ceil(NON_SPEAKING_DURATION / seconds_per_chunk))
+        max_bytes = (max_chunks + preroll.maxlen) * CHUNK_SIZE * 2
+        phrase = self.acquire_buf(max_bytes)
+        phrase_view = memoryview(phrase)
+        phrase_len = 0
+        chunk_count = speech_count = silence_count = 0
+        silence_bytes = 0  # Байт тишины в конце текущей фразы
+        trailing_bytes = int(TRAILING_SILENCE * sample_rate) * 2
+
         # Основной цикл записи
+        self.post_status("Слушаю... Говорите")
         while self.is_recording:
-            self.status_var.set("Слушаю... Говорите")
-            
-            try:
-                # Создаем новый экземпляр микрофона для каждого цикла прослушивания
-                # Это помогает избежать проблем с закрытием ресурсов
-                with sr.Microphone(device_index=self.selected_device_id) as source:
-                    # Запись аудио с таймаутом
-                    audio = self.recognizer.listen(
-                        source,
-                        timeout=3,           # Уменьшаем таймаут
-                        phrase_time_limit=15 # Увеличиваем максимальное время фразы
-                    )
+            # Остановка кладёт в очередь None, поэтому ждать можно без таймаута
+            chunk = self._audio_q.get()
+            if chunk is None:
+                break
 
-                self.status_var.set("Распознавание...")
-                
-                # Логирование параметров аудио
-                logger.info(f"Параметры аудио: sample_rate={audio.sample_rate}, sample_width={audio.sample_width}, frame_data size={len(audio.frame_data)}")
-
-                # Преобразование аудио в формат WAV для Whisper
-                wav_data = io.BytesIO()
-                
-                # Проверяем корректность параметров аудио для WAV формата
-                if audio.sample_width not in [1, 2, 4]:
-                    logger.warning(f"Неподдерживаемый sample_width: {audio.sample_width}. Пропускаем фрейм.")
-                    continue
-                
-                if audio.sample_rate <= 0 or audio.sample_rate > 192000:  # Максимальная частота дискретизации для WAV
-                    logger.warning(f"Неподдерживаемая частота дискретизации: {audio.sample_rate}. Пропускаем фрейм.")
-                    continue
-                
-                # speech_recognition обычно возвращает моно-аудио, поэтому количество каналов = 1
-                # Проверка количества каналов не требуется, так как оно фиксировано
-                
-                try:
-                    with wave.open(wav_data, 'wb') as wav_file:
-                        # Устанавливаем параметры аудио
-                        wav_file.setnchannels(1)  # Обычно микрофон - моно (1 канал)
-                        wav_file.setsampwidth(audio.sample_width)
-                        wav_file.setframerate(audio.sample_rate)
-                        wav_file.writeframes(audio.frame_data)
-                except struct.error as e:
-                    logger.error(f"Ошибка при записи аудиофрейма: {e}", exc_info=True)
-                    # Пропускаем этот фрейм и переходим к следующей итерации основного цикла
-                    continue
-                
-                # Сохранение временного файла
-                try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                        temp_file.write(wav_data.getvalue())
-                        temp_filename = temp_file.name
-                    logger.info(f"Временный файл создан: {temp_filename}")
-                except Exception as e:
-                    logger.error(f"Ошибка при создании временного файла: {e}", exc_info=True)
+            # Простой энергетический VAD по каждому буферу
+            energy = pcm16_energy(chunk)
+            is_speech = energy > self.energy_threshold
+            if is_speech and frame_vad is not None:
+                is_speech = pcm16_has_speech(frame_vad, chunk, sample_rate, frame_bytes)
+
+            if not chunk_count:
+                if not is_speech:
+                    # Ждём начала речи, подстраиваясь под фоновый шум
+                    self.adjust_energy_threshold(energy, seconds_per_chunk)
+                    preroll.append(chunk)
                     continue
-                
+                for buffered in preroll:
+                    phrase_view[phrase_len:phrase_len + len(buffered)] = buffered
+                    phrase_len += len(buffered)
+                preroll.clear()
+
+            phrase_view[phrase_len:phrase_len + len(chunk)] = chunk
+            phrase_len += len(chunk)
+            chunk_count += 1
+            if is_speech:
+                speech_count += 1
+                silence_count = silence_bytes = 0
+            else:
+                silence_count += 1
+                silence_bytes += len(chunk)
+
+            # Фраза завершена паузой или достигла предельной длительности
+            if silence_count >= pause_chunks or chunk_count >= window_chunks:
+                if speech_count >= phrase_chunks or streaming:
+                    # Буфер уходит распознаванию вместе с фразой (или окном потокового режима),
+                    # для следующей фразы берём другой из пула
+                    if speech_count >= phrase_chunks:
+                        kind = "final" if streaming else "phrase"
+                        # Whisper не нужна вся пауза, завершившая фразу
+                        phrase_len -= max(0, silence_bytes - trailing_bytes)
+                    else:
+                        kind = "discard"
+                    utterance_q.put((kind, phrase, phrase_len, sample_rate))
+                    phrase = self.acquire_buf(max_bytes)
+                    phrase_view = memoryview(phrase)
+                phrase_len = 0
+                chunk_count = speech_count = silence_count = silence_bytes = 0
+                self.post_status("Слушаю... Говорите")
+            elif streaming and chunk_count % hop_chunks == 0 and speech_count >= phrase_chunks:
                 try:
-                    # Проверяем существование временного файла перед транскрибацией
-                    if not os.path.exists(temp_filename):
-                        logger.error(f"Временный файл {temp_filename} не существует")
-                        continue
-                    
-                    # Распознавание через локальную модель Whisper
-                    logger.info(f"Начинается транскрибация файла {temp_filename} с языком {self.get_whisper_language_code()}")
-                    result = self.whisper_model.transcribe(temp_filename, language=self.get_whisper_language_code())
-                    text = result['text']
-                    logger.info(f"Транскрибация завершена. Результат: {text}")
-                    
-                    # Добавление текста в поле
-                    self.root.after(0, self.append_text, text)
-                    
-                except FileNotFoundError as e:
-                    # Ошибка может быть вызвана отсутствием ffmpeg или другого необходимого компонента
-                    logger.error("Ошибка: необходимый компонент не найден. Установите ffmpeg для корректной работы Whisper.", exc_info=True)
-                    self.root.after(
-                        0,
-                        lambda: self.status_var.set("Ошибка: отсутствует необходимый компонент (ffmpeg), см. логи...")
-                    )
-                    continue
-                except Exception as e:
-                    # Проверяем, содержит ли ошибка указание на отсутствие файла, что может указывать на отсутствие ffmpeg
-                    if "file" in str(e).lower() and "not found" in str(e).lower() or isinstance(e, FileNotFoundError):
-                        logger.error("Ошибка: необходимый компонент не найден. Установите ffmpeg для корректной работы Whisper.", exc_info=True)
-                        self.root.after(
-                            0,
-                            lambda: self.status_var.set("Ошибка: отсутствует необходимый компонент (ffmpeg), см. логи...")
-                        )
-                        continue
-                    logger.error(f"Ошибка транскрибации Whisper: {e}", exc_info=True)
-                    self.root.after(
-                        0,
-                        lambda: self.status_var.set("Ошибка транскрибации, продолжаю...")
-                    )
-                    continue
-                except Exception as e:
-                    logger.error(f"Ошибка транскрибации Whisper: {e}", exc_info=True)  # Добавляем информацию об исключении
-                    self.root.after(
-                        0,
-                        lambda: self.status_var.set("Ошибка транскрибации, продолжаю...")
-                    )
-                    continue
-                finally:
-                    # Удаление временного файла
-                    if os.path.exists(temp_filename):
-                        os.unlink(temp_filename)
-
-            except sr.WaitTimeoutError:
-                # Таймаут - продолжаем слушать
-                continue
-            except sr.UnknownValueError:
-                # Речь не распознана
-                self.status_var.set("Речь не распознана, продолжаю...")
-                continue
-            except sr.RequestError as e:
-                logger.error(f"Ошибка запроса к сервису распознавания: {e}")
-                self.status_var.set("Ошибка сервиса распознавания, продолжаю...")
-                continue
-            except OSError as e:
-                # Ошибка PyAudio, например, если микрофон занят или недоступен
-                logger.error(f"Ошибка PyAudio: {e}")
-                self.root.after(
-                    0,
-                    messagebox.showerror,
-                    "Ошибка",
-                    f"Ошибка аудиоустройства: {e}\n\nУбедитесь, что микрофон не используется другими приложениями."
-                )
+                    utterance_q.put_nowait(("partial", phrase, phrase_len, sample_rate))
+                except queue.Full:
+                    pass  # Распознавание не успевает: промежуточный результат всё равно устарел бы
+
+        # Распознаём фразу, прерванную остановкой записи, и завершаем поток распознавания
+        if speech_count >= phrase_chunks:
+            phrase_len -= max(0, silence_bytes - trailing_bytes)
+            utterance_q.put(("final" if streaming else "phrase", phrase, phrase_len, sample_rate))
+        else:
+            utterance_q.put(("discard", phrase, 0, sample_rate))
+        utterance_q.put(None)
+
+        # Запоминаем порог, подстроенный за сессию, для следующей записи (если калибровку не сбросили)
+        if device_id in self._calibrated_devices:
+            self._calibrated_devices[device_id] = (sensitivity, self.energy_threshold)
+
+    def transcribe_loop(self, utterance_q):
+        """Поток распознавания: обрабатывает фразы, пока запись уже слушает следующие"""
+        while True:
+            item = utterance_q.get()
+            if item is None:
                 break
+            kind, buf, length, sample_rate = item
+            pcm = memoryview(buf)[:length]
+            if not self._model_ready.is_set():
+                # Запись начата до окончания первой загрузки модели: звук копится в очереди
+                self.post_status("Ожидание загрузки модели...")
+                self._model_ready.wait()
+            try:
+                if kind == "phrase":
+                    self.transcribe_phrase(pcm, sample_rate)
+                elif kind == "partial":
+                    self.transcribe_stream_partial(pcm, sample_rate)
+                elif kind == "final":
+                    self.transcribe_stream_final(pcm, sample_rate)
+                else:
+                    self.reset_stream_state()
             except Exception as e:
-                logger.error(f"Неизвестная ошибка при прослушивании: {e}")
-                self.root.after(
-                    0,
-                    messagebox.showerror,
-                    "Ошибка",
-                    f"Ошибка при прослушивании: {e}"
-                )
-                break
+                # Поток не должен завершиться: иначе запись встанет на заполненной очереди фраз
+                logger.error(f"Ошибка обработки фразы: {e}", exc_info=True)
+                self.post_status("Ошибка транскрибации, продолжаю...")
+            finally:
+                # Промежуточные результаты ссылаются на буфер, который ещё заполняется
+                if kind != "partial":
+                    self.release_buf(buf)
+        # Интерфейс после сессии восстанавливает wait_session_end, который ждёт этот поток
 
-        # В конце останавливаем запись
-        self.root.after(0, self.stop_recording)
+    def transcribe_phrase(self, pcm, sample_rate):
+        """Распознаёт одну фразу и добавляет текст в поле"""
+        self.post_status("Распознавание...")
+        logger.info(f"Параметры аудио: sample_rate={sample_rate}, frame_data size={len(pcm)}")
+
+        # Преобразование аудио в массив float32 16 кГц без WAV и временного файла.
+        # Общий буфер можно занять, только если распознавание синхронное: дочернему
+        # процессу массив сериализуется уже после возврата из этого метода
+        executor = self._exec
+        samples = pcm16_to_samples(pcm, sample_rate, None if executor is not None else self._samples_buf)
+        if not contains_speech(samples, self.get_active_model()):
+            logger.info("VAD не обнаружил речи во фразе, транскрибация пропущена")
+            return
 
-    def transcribe_audio_buffer(self):
-        """Транскрибирует весь аудио буфер за раз"""
         try:
-            if not self.audio_buffer:
-                logger.info("Аудио буфер пуст, нечего транскрибировать")
-                self.root.after(0, lambda: self.status_var.set("Нет аудио для транскрибации"))
-                self.root.after(0, lambda: self.record_btn.config(text="Начать запись"))
-                self.root.after(0, lambda: self.indicator_canvas.itemconfig(self.indicator, fill="gray"))
-                return
-
-            # Создаем общий аудио файл из буфера
-            combined_wav_data = io.BytesIO()
-            
-            # Используем первый фрейм для определения параметров
-            first_frame = self.audio_buffer[0]
-            sample_rate = first_frame['sample_rate']
-            sample_width = first_frame['sample_width']
-            
-            # Проверяем корректность параметров аудио для WAV формата
-            if sample_width not in [1, 2, 4]:
-                logger.warning(f"Неподдерживаемый sample_width: {sample_width}")
-                self.root.after(0, lambda: self.status_var.set("Неподдерживаемый формат аудио"))
-                self.root.after(0, lambda: self.record_btn.config(text="Начать запись"))
-                self.root.after(0, lambda: self.indicator_canvas.itemconfig(self.indicator, fill="gray"))
-                return
-            
-            if sample_rate <= 0 or sample_rate > 192000:  # Максимальная частота дискретизации для WAV
-                logger.warning(f"Неподдерживаемая частота дискретизации: {sample_rate}")
-                self.root.after(0, lambda: self.status_var.set("Неподдерживаемый формат аудио"))
-                self.root.after(0, lambda: self.record_btn.config(text="Начать запись"))
-                self.root.after(0, lambda: self.indicator_canvas.itemconfig(self.indicator, fill="gray"))
-                return
-            
-            # Создаем WAV файл с объединенными данными
-            with wave.open(combined_wav_data, 'wb') as wav_file:
-                wav_file.setnchannels(1)  # Обычно микрофон - моно (1 канал)
-                wav_file.setsampwidth(sample_width)
-                wav_file.setframerate(sample_rate)
-                
-                # Записываем все фреймы
-                for frame in self.audio_buffer:
-                    # Проверяем, что параметры совпадают с первым фреймом
-                    if frame['sample_rate'] != sample_rate or frame['sample_width'] != sample_width:
-                        logger.warning("Несоответствие параметров аудио во фрейме, пропускаем")
-                        continue
-                    wav_file.writeframes(frame['frame_data'])
-            
-            # Сохраняем временный файл
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                temp_file.write(combined_wav_data.getvalue())
-                temp_filename = temp_file.name
-            logger.info(f"Временный файл создан для транскрибации: {temp_filename}")
-
-            # Выполняем транскрибацию
-            self.root.after(0, lambda: self.status_var.set("Выполняется транскрибация..."))
-            result = self.whisper_model.transcribe(temp_filename, language=self.get_whisper_language_code())
-            text = result['text']
+            if executor is not None:
+                try:
+                    future = executor.submit(
+                        _worker_transcribe,
+                        samples,
+                        self.get_whisper_language_code(),
+                        None,
+                        self.get_beam_size()
+                    )
+                except concurrent.futures.BrokenExecutor:
+                    # Дочерний процесс упал (например, не загрузил модель): фраза распознаётся здесь
+                    self.drop_broken_process(executor)
+                else:
+                    # Результат придёт из дочернего процесса, запись продолжается без ожидания
+                    logger.info(f"Транскрибация {len(samples)} сэмплов отправлена в дочерний процесс")
+                    future.add_done_callback(functools.partial(self._on_transcription_done, executor))
+                    return
+
+            # Распознавание через локальную модель Whisper
+            logger.info(f"Начинается транскрибация {len(samples)} сэмплов с языком {self.get_whisper_language_code()}")
+            text = self.transcribe_samples(samples)
             logger.info(f"Транскрибация завершена. Результат: {text}")
-            
-            # Обновляем интерфейс в основном потоке
-            self.root.after(0, self.display_transcription_result, text)
-            
-        except FileNotFoundError as e:
-            # Ошибка может быть вызвана отсутствием ffmpeg или другого необходимого компонента
-            logger.error("Ошибка: необходимый компонент не найден. Установите ffmpeg для корректной работы Whisper.", exc_info=True)
-            self.root.after(0, lambda: self.status_var.set("Ошибка: отсутствует необходимый компонент (ffmpeg), см. логи..."))
-            self.root.after(0, lambda: self.record_btn.config(text="Начать запись"))
-            self.root.after(0, lambda: self.indicator_canvas.itemconfig(self.indicator, fill="gray"))
+
+            # Добавление текста в поле
+            self.post_append(text)
+
         except Exception as e:
-            logger.error(f"Ошибка транскрибации: {e}", exc_info=True)
-            self.root.after(0, lambda: self.status_var.set(f"Ошибка транскрибации: {str(e)}"))
-            self.root.after(0, lambda: self.record_btn.config(text="Начать запись"))
-            self.root.after(0, lambda: self.indicator_canvas.itemconfig(self.indicator, fill="gray"))
-        finally:
-            # Удаляем временный файл
+            logger.error(f"Ошибка транскрибации Whisper: {e}", exc_info=True)
+            self.post_status("Ошибка транскрибации, продолжаю...")
+
+    def transcribe_samples(self, samples, initial_prompt=None):
+        """Распознаёт сэмплы в дочернем процессе (если он включён) или в текущем, дожидаясь результата"""
+        language = self.get_whisper_language_code()
+        beam_size = self.get_beam_size()
+        executor = self._exec
+        if executor is not None:
             try:
-                if 'temp_filename' in locals() and os.path.exists(temp_filename):
-                    os.unlink(temp_filename)
-            except:
-                pass  # Игнорируем ошибки при удалении временного файла
-
-    def display_transcription_result(self, text):
-        """Отображает результат транскрибации в интерфейсе"""
-        # Очищаем текстовое поле и добавляем новый текст
-        self.text_area.delete("1.0", tk.END)
-        self.text_area.insert(tk.END, text)
-        self.text_area.see(tk.END)
-        
-        # Копируем в буфер обмена
-        pyperclip.copy(text)
-        
-        # Обновляем статус и кнопки
-        self.status_var.set("Транскрибация завершена! Результат скопирован в буфер обмена.")
-        self.record_btn.config(text="Начать запись")
-        self.indicator_canvas.itemconfig(self.indicator, fill="gray")
+                return executor.submit(_worker_transcribe, samples, language, initial_prompt, beam_size).result()
+            except concurrent.futures.BrokenExecutor:
+                self.drop_broken_process(executor)
+        return transcribe_with_model(self.get_active_model(), samples, language, initial_prompt, beam_size)
+
+    def get_active_model(self):
+        """Текущая модель основного процесса; чтение согласовано с её заменой"""
+        with self._active_model_lock:
+            return self.whisper_model
+
+    def _on_transcription_done(self, executor, future):
+        """Callback завершения распознавания в дочернем процессе"""
+        try:
+            text = future.result()
+        except concurrent.futures.BrokenExecutor:
+            # Отправленная фраза потеряна, следующие распознаются в основном процессе
+            self.drop_broken_process(executor)
+            return
+        except Exception as e:
+            logger.error(f"Ошибка транскрибации Whisper в дочернем процессе: {e}", exc_info=True)
+            self.post_status("Ошибка транскрибации, продолжаю...")
+            return
+        logger.info(f"Транскрибация завершена. Результат: {text}")
+        self.post_append(text)
+
+    def reset_stream_state(self):
+        """Сбрасывает гипотезы потокового распознавания для нового окна"""
+        self._stream_hypothesis = []
+        self._stream_committed = 0
+
+    def transcribe_stream_window(self, pcm, sample_rate):
+        """Распознаёт текущее окно потокового режима и возвращает список слов (None при ошибке)"""
+        # Окно распознаётся синхронно, поэтому можно писать в общий буфер
+        samples = pcm16_to_samples(pcm, sample_rate, self._samples_buf)
+        if not contains_speech(samples, self.get_active_model()):
+            return []
+        # Хвост уже выданного текста связывает соседние окна
+        context = self._stream_context[-STREAM_CONTEXT_CHARS:] or None
+        try:
+            text = self.transcribe_samples(samples, initial_prompt=context)
+        except Exception as e:
+            logger.error(f"Ошибка потоковой транскрибации Whisper: {e}", exc_info=True)
+            self.post_status("Ошибка транскрибации, продолжаю...")
+            return None
+        return text.split()
+
+    def transcribe_stream_partial(self, pcm, sample_rate):
+        """Промежуточное распознавание: выдаёт слова, совпавшие в двух гипотезах подряд"""
+        words = self.transcribe_stream_window(pcm, sample_rate)
+        if words is None:
+            return
+        stable = common_prefix_length(self._stream_hypothesis, words)
+        self._stream_hypothesis = words
+        if stable > self._stream_committed:
+            self.commit_stream_words(words[self._stream_committed:stable])
+
+    def transcribe_stream_final(self, pcm, sample_rate):
+        """Окончательное распознавание окна: выдаёт все ещё не выданные слова"""
+        words = self.transcribe_stream_window(pcm, sample_rate)
+        if words is None:
+            words = self._stream_hypothesis
+        if len(words) > self._stream_committed:
+            self.commit_stream_words(words[self._stream_committed:])
+        self.reset_stream_state()
+
+    def commit_stream_words(self, words):
+        """Добавляет подтверждённые слова в текстовое поле"""
+        text = " ".join(words)
+        logger.info(f"Потоковый результат: {text}")
+        self._stream_committed += len(words)
+        self._stream_context = f"{self._stream_context} {text}"[-STREAM_CONTEXT_CHARS:]
+        self.post_append(text)
+
+    def wait_session_end(self):
+        """Дожидается распознавания последних фраз сессии и возвращает кнопку записи"""
+        # Поток распознавания создаётся потоком записи после калибровки, поэтому
+        # ссылка на него читается только после завершения записи
+        if self.record_thread is not None:
+            self.record_thread.join()
+        if self._transcribe_thread is not None:
+            self._transcribe_thread.join()
+        self.post_status("Готов к записи")
+        self.post_ui(self.reset_record_controls)
 
     def append_text(self, text):
         """Добавляет распознанный текст в текстовое поле"""
-        current_text = self.text_area.get("1.0", tk.END).strip()
-
-        if current_text:
-            self.text_area.insert(tk.END, " " + text)
-        else:
-            self.text_area.insert(tk.END, text)
+        # Сегменты Whisper начинаются с пробела; пустой результат не меняет текст и буфер обмена
+        text = text.strip()
+        if not text:
+            return
+        # <<Modified>> доставляется из очереди событий: ручная правка могла ещё не попасть
+        # в _full_text, а сброс флага ниже её бы потерял
+        if self.text_area.edit_modified():
+            self.on_text_modified()
+        if self._text_len:
+            text = " " + text
+        self.text_area.insert(tk.END, text)
+        self.text_area.edit_modified(False)
+        self._full_text.append(text)
+        self._text_len += len(text)
 
         self.text_area.see(tk.END)
 
@@ -599,12 +1467,25 @@ class VoiceTranscriberApp:
 
         self.status_var.set("Текст добавлен! Слушаю...")
 
+    def on_text_modified(self, event=None):
+        """Перечитывает текст из поля, если его изменил пользователь"""
+        # Программные вставки сразу сбрасывают флаг, поэтому он установлен только после ручной правки
+        if not self.text_area.edit_modified():
+            return
+        text = self.text_area.get("1.0", "end-1c")
+        self._full_text = [text]
+        self._text_len = len(text)
+        self.text_area.edit_modified(False)
+
     def copy_to_clipboard(self, show_message=True):
         """Копирует текст в буфер обмена"""
-        text = self.text_area.get("1.0", tk.END).strip()
+        # Склеенный текст сохраняется вместо списка фрагментов: повторное копирование его не пересобирает
+        if len(self._full_text) > 1:
+            self._full_text = ["".join(self._full_text)]
+        text = self._full_text[0].strip() if self._full_text else ""
 
         if text:
-            pyperclip.copy(text)
+            self.post_clipboard(text)
             if show_message:
                 self.status_var.set("Текст скопирован в буфер обмена!")
         else:
@@ -612,57 +1493,34 @@ class VoiceTranscriberApp:
                 messagebox.showwarning("Внимание", "Нет текста для копирования")
 
     def clear_text(self):
-        """Очищает текстовое поле, буфер и буфер обмена"""
+        """Очищает текстовое поле и буфер обмена"""
         self.text_area.delete("1.0", tk.END)
-        self.audio_buffer = []  # Очищаем аудио буфер
-        try:
-            pyperclip.copy("")  # Очищаем буфер обмена
-        except:
-            pass  # Если не удалось очистить буфер обмена, игнорируем ошибку
+        self.text_area.edit_modified(False)
+        self._full_text = []
+        self._text_len = 0
+        self._stream_context = ""  # Контекст потокового режима больше не относится к тексту
+        self.post_clipboard("")  # Очищаем буфер обмена
         self.status_var.set("Текст очищен")
 
     def get_whisper_language_code(self):
-        """Преобразует код языка из формата Google в формат Whisper"""
-        google_to_whisper = {
-            "ru-RU": "ru",
-            "en-US": "en",
-            "de-DE": "de",
-            "fr-FR": "fr",
-            "es-ES": "es"
-        }
-        return google_to_whisper.get(self.language_var.get(), "en")
+        """Возвращает код языка Whisper, соответствующий выбранному в интерфейсе"""
+        return self._whisper_language
+
+    def on_language_changed(self, *args):
+        """Обновляет код языка Whisper при выборе другого языка"""
+        self._whisper_language = GOOGLE_TO_WHISPER_LANGUAGE.get(self.language_var.get(), "en")
+
+    def get_beam_size(self):
+        """Ширина луча декодера в зависимости от переключателя «Точное распознавание»"""
+        return self._beam_size
+
+    def on_accuracy_changed(self, *args):
+        """Обновляет ширину луча при переключении «Точное распознавание»"""
+        self._beam_size = BEAM_SIZE_ACCURATE if self.accurate_var.get() else BEAM_SIZE_FAST
 
     def get_input_devices(self):
-        """Получение списка доступных устройств ввода"""
-        try:
-            audio = pyaudio.PyAudio()
-            device_count = audio.get_device_count()
-            input_devices = []
-            
-            for i in range(device_count):
-                info = audio.get_device_info_by_index(i)
-                if info['maxInputChannels'] > 0:  # Устройство поддерживает ввод
-                    # Декодируем имя устройства, чтобы избежать проблем с кодировкой
-                    device_name = info['name']
-                    try:
-                        # Попробуем декодировать строку, если она закодирована в неправильной кодировке
-                        if isinstance(device_name, bytes):
-                            device_name = device_name.decode('utf-8')
-                        else:
-                            # Если строка содержит искаженные символы, попробуем преобразовать
-                            # Попытка исправить кодировку, если есть проблемы с отображением
-                            device_name = device_name.encode('utf-8', errors='ignore').decode('utf-8')
-                    except UnicodeDecodeError:
-                        # Если возникла ошибка декодирования, используем оригинальное имя
-                        device_name = info['name']
-                    
-                    input_devices.append((i, device_name))
-            
-            audio.terminate()
-            return input_devices
-        except Exception as e:
-            logger.error(f"Ошибка при получении списка устройств ввода: {e}")
-            return []
+        """Получение списка доступных устройств ввода (перечисляются один раз, при первом вызове)"""
+        return list(probe_input_devices())
 
     def on_device_selected(self, event=None):
         """Обработка выбора устройства ввода"""
@@ -676,36 +1534,155 @@ class VoiceTranscriberApp:
                 self.selected_device_id = None
         else:
             self.selected_device_id = None
+        # Выбранное устройство откалибруется заново при следующей записи
+        self._calibrated_devices.pop(self.selected_device_id, None)
+
+    def recalibrate(self):
+        """Сбрасывает сохранённую калибровку выбранного устройства"""
+        self._calibrated_devices.pop(self.selected_device_id, None)
+        if self.is_recording:
+            self.status_var.set("Калибровка будет выполнена при следующей записи")
+        else:
+            self.status_var.set("Калибровка будет выполнена в начале записи")
 
     def update_sensitivity_label(self, *args):
         """Обновление метки с текущим значением чувствительности"""
         value = int(self.sensitivity_var.get())
         self.sensitivity_label.config(text=str(value))
 
-    def update_energy_threshold(self):
-        """Обновление порога чувствительности"""
-        self.recognizer.energy_threshold = int(self.sensitivity_var.get())
-
     def on_model_selected(self, event=None):
         """Обработка выбора модели распознавания"""
         selected_model = self.model_var.get()
-        logger.info(f"Выбрана модель распознавания: {selected_model}")
+        compute_type = self.compute_type_var.get()
+        device = self.compute_device_var.get()
+        logger.info(f"Выбрана модель распознавания: {selected_model} ({compute_type}, {device})")
         
-        # Загружаем новую модель в отдельном потоке, чтобы не блокировать UI
-        threading.Thread(target=self.load_model_async, args=(selected_model,), daemon=True).start()
+        # Загружаем новую модель в фоновом потоке, чтобы не блокировать UI
+        put_latest(self._load_q, (selected_model, compute_type, device))
+
+    def model_loader_loop(self):
+        """Поток загрузки моделей: загружает последнюю выбранную, пока не будет запрошена следующая"""
+        while True:
+            self.load_model_async(*self._load_q.get())
 
-    def load_model_async(self, model_name):
+    def load_model_async(self, model_name, compute_type=DEFAULT_COMPUTE_TYPE, device=DEFAULT_COMPUTE_DEVICE):
         """Асинхронная загрузка модели"""
         try:
-            logger.info(f"Начинается загрузка модели {model_name}...")
-            self.root.after(0, lambda: self.status_var.set(f"Загрузка модели {model_name}..."))
-            self.whisper_model = whisper.load_model(model_name)
+            logger.info(f"Начинается загрузка модели {model_name} ({compute_type}, {device})...")
+            self.post_status(f"Загрузка модели {model_name}...")
+            key = (model_name, compute_type, device)
+            model = self.get_or_load_model(*key)
+            # Поток распознавания берёт модель в локальную переменную и дорабатывает фразу на старой;
+            # её память освобождает вытеснение из LRU-кэша, а не эта замена
+            with self._active_model_lock:
+                self.whisper_model, self._model_key = model, key
+            executor = self._exec
+            if executor is not None:
+                # Дочерний процесс переключается на новую модель после уже отправленных фраз,
+                # без перезапуска и с собственным кэшем моделей
+                try:
+                    future = executor.submit(_worker_use_model, *key)
+                except concurrent.futures.BrokenExecutor:
+                    self.drop_broken_process(executor)
+                else:
+                    future.add_done_callback(functools.partial(self._on_worker_model_switched, executor, model_name))
             logger.info(f"Модель {model_name} успешно загружена")
-            self.root.after(0, lambda: self.status_var.set(f"Модель {model_name} загружена"))
+            self.post_status(f"Модель {model_name} загружена")
         except Exception as e:
             logger.error(f"Ошибка при загрузке модели {model_name}: {e}")
             error_msg = f"Ошибка загрузки модели {model_name}: {str(e)}"
-            self.root.after(0, lambda msg=error_msg: self.status_var.set(msg))
+            self.post_status(error_msg)
+        finally:
+            # Даже после ошибки ожидающие фразы не должны зависнуть: они завершатся ошибкой распознавания
+            self._model_ready.set()
+
+    def _on_worker_model_switched(self, executor, model_name, future):
+        """Callback переключения модели в дочернем процессе"""
+        try:
+            future.result()
+        except Exception as e:
+            # Иначе процесс продолжал бы распознавать старой моделью; новая уже есть в основном процессе
+            logger.error(f"Дочерний процесс не загрузил модель {model_name}: {e}")
+            self.drop_broken_process(executor)
+
+    def get_or_load_model(self, model_name, compute_type, device):
+        """Возвращает модель из LRU-кэша, загружая её только при первом обращении"""
+        key = (model_name, compute_type, device)
+        with self._model_lock:
+            model = self._model_cache.get(key)
+            if model is not None:
+                logger.info(f"Модель {model_name} ({compute_type}, {device}) взята из кэша")
+                self._model_cache.move_to_end(key)
+                return model
+
+            model = load_whisper_model(model_name, compute_type, device)
+            self._model_cache[key] = model
+            # Вытесняем давно не использованную модель, чтобы освободить память
+            evicted = False
+            while len(self._model_cache) > MODEL_CACHE_SIZE:
+                (evicted_name, evicted_type, evicted_device), _ = self._model_cache.popitem(last=False)
+                logger.info(f"Модель {evicted_name} ({evicted_type}, {evicted_device}) выгружена из кэша")
+                evicted = True
+        if evicted:
+            # Веса освобождаются сразу, а не при следующем проходе сборщика мусора
+            gc.collect()
+            if WHISPER_BACKEND == "whisper" and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        return model
+
+
+    def on_close(self):
+        """Останавливает запись и дочерний процесс до уничтожения окна"""
+        # Рабочие потоки читают переменные Tk, поэтому должны завершиться раньше интерпретатора
+        self.stop_listening()
+        self.close_stream()
+        self.stop_transcription_process()
+        self.root.destroy()
+
+    def on_separate_process_toggled(self):
+        """Включение или выключение распознавания в дочернем процессе"""
+        if self.separate_process_var.get():
+            self.start_transcription_process()
+        else:
+            self.stop_transcription_process()
+
+    def start_transcription_process(self):
+        """Запускает (или перезапускает) дочерний процесс распознавания с текущей моделью"""
+        with self._active_model_lock:
+            model_key = self._model_key
+        logger.info(f"Запуск дочернего процесса распознавания для модели {model_key[0]}")
+        # spawn, а не fork по умолчанию в Linux: копия процесса с потоками Tk и PortAudio
+        # и уже инициализированной CUDA не может снова инициализировать CUDA
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init,
+            initargs=model_key
+        )
+        # Процесс и загрузка модели стартуют сразу, а не на первой фразе
+        executor.submit(_worker_ping)
+        with self._exec_lock:
+            old_executor, self._exec = self._exec, executor
+        if old_executor is not None:
+            old_executor.shutdown(wait=False, cancel_futures=True)
+
+    def drop_broken_process(self, executor):
+        """Отключает сломанный дочерний процесс; распознавание продолжается в основном процессе"""
+        with self._exec_lock:
+            if self._exec is not executor:
+                return  # Уже отключён или перезапущен
+            self._exec = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.error("Дочерний процесс распознавания отключён, распознавание переведено в основной процесс")
+        self.post_status("Дочерний процесс отключён, распознавание продолжается в основном процессе")
+        self.post_ui(self.separate_process_var.set, False)
+
+    def stop_transcription_process(self):
+        """Останавливает дочерний процесс распознавания"""
+        with self._exec_lock:
+            executor, self._exec = self._exec, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
 
 
 def main():
@@ -713,11 +1690,18 @@ def main():
     root.title("⏯ Голосовой - ⏯ранскрибер")  # Добавляем символ ⏯ в заголовок окна
     app = VoiceTranscriberApp(root)
     
-    # Привязываем клавишу Escape к выходу из программы
-    root.bind('<Escape>', lambda e: root.destroy())
+    # Закрытие окна и клавиша Escape сначала останавливают запись и распознавание
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    root.bind('<Escape>', lambda e: app.on_close())
     
     root.mainloop()
 
+    # Единственный экземпляр PortAudio освобождается после выхода из главного цикла, если он создавался
+    if get_pyaudio.cache_info().currsize:
+        get_pyaudio().terminate()
+
 
 if __name__ == "__main__":
+    # В собранном PyInstaller exe дочерний процесс spawn иначе запустил бы второе окно вместо _worker_init
+    multiprocessing.freeze_support()
     main()